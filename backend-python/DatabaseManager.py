@@ -63,6 +63,20 @@ class DatabaseManager:
             )
         ''')
 
+        # Create intent_logs table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS intent_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message TEXT,
+                intent TEXT,
+                entities TEXT,
+                latency_ms REAL,
+                queue_ms REAL,
+                within_budget INTEGER,
+                logged_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
         conn.commit()
         conn.close()
         print(f"Database '{self.db_name}' initialized successfully.")
@@ -209,4 +223,24 @@ class ReturnDB:
         cursor.execute('UPDATE returns SET status = ? WHERE id = ?', (new_status, return_id))
         conn.commit()
         conn.close()
-        return True
\ No newline at end of file
+        return True
+
+
+class IntentLogDB:
+    """Handles CRUD operations for the 'intent_logs' table."""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def log_intent(self, message, intent, entities, latency_ms, queue_ms, within_budget):
+        """Records a Gemini intent decision, its call and queue times. Returns the log ID."""
+        conn = self.db_manager._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO intent_logs (message, intent, entities, latency_ms, queue_ms, within_budget)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (message, intent, json.dumps(entities), latency_ms, queue_ms, int(within_budget)))
+        conn.commit()
+        log_id = cursor.lastrowid
+        conn.close()
+        return log_id
@@ -5,8 +5,11 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import requests
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
-from DatabaseManager import DatabaseManager, OrderDB, ReturnDB, UserDB
+from DatabaseManager import DatabaseManager, IntentLogDB, OrderDB, ReturnDB, UserDB
 import json
 
 
@@ -20,6 +23,14 @@ PORT = int(os.getenv('PORT', 3001))
 FAKE_STORE_API = 'https://fakestoreapi.com'
 DUMMY_JSON_API = 'https://dummyjson.com/products'
 
+# Upper bound on how long /api/chat waits for the Gemini intent call before
+# answering locally. Clients may ask for a tighter budget per request.
+CHAT_LATENCY_BUDGET_MS = int(os.getenv('CHAT_LATENCY_BUDGET_MS', 3000))
+gemini_executor = ThreadPoolExecutor(max_workers=int(os.getenv('GEMINI_MAX_WORKERS', 8)))
+# A single writer keeps intent_logs inserts off the request threads and
+# stops them contending for the SQLite lock.
+intent_log_executor = ThreadPoolExecutor(max_workers=1)
+
 gemini_session_id= "example_session_id_12345"  # In real scenarios, this should be dynamic per user/session
 
 db_manager = DatabaseManager() 
@@ -28,6 +39,7 @@ db_manager = DatabaseManager()
 user_db = UserDB(db_manager)
 order_db = OrderDB(db_manager)
 return_db = ReturnDB(db_manager)
+intent_log_db = IntentLogDB(db_manager)
 
 # Import Gemini connector
 try:
@@ -123,26 +135,59 @@ def chatold():
                 print('Gemini error:', gemini_error)
                 response = "Sorry, I couldn't process your request with Gemini. Please try again later."
         if not response:
-            lower_message = message.lower()
-            response = "I'm here to help with your shopping needs!"
-            if 'hello' in lower_message or 'hi' in lower_message:
-                response = "Hello! How can I assist with your shopping today?"
-            elif 'price' in lower_message or 'cost' in lower_message:
-                response = "Our prices are very competitive. Which product are you interested in?"
-            elif 'shipping' in lower_message or 'delivery' in lower_message:
-                response = "We offer free shipping on orders over $50. Delivery usually takes 3-5 business days."
-            elif 'return' in lower_message or 'exchange' in lower_message:
-                response = "We have a 30-day return policy. Items must be unused and in original packaging."
-            elif 'electronics' in lower_message:
-                response = "We have a great selection of electronics including laptops, smartphones, and accessories. Check out our electronics category!"
-            elif 'clothing' in lower_message or 'clothes' in lower_message:
-                response = "We offer a variety of men's and women's clothing. Is there a specific type you're looking for?"
-            elif 'jewelry' in lower_message:
-                response = "Our jewelry collection includes rings, necklaces, earrings, and more. All made with high-quality materials."
+            response = get_local_response(message)
         return jsonify({'response': response})
     except Exception as e:
         print('Chat error:', e)
         return jsonify({'error': 'Failed to process message'}), 500
+
+LOCAL_GREETING_RESPONSE = "Hello! How can I assist with your shopping today?"
+LOCAL_DEFAULT_RESPONSE = "I'm here to help with your shopping needs!"
+LOCAL_TOPIC_RESPONSES = [
+    (('price', 'cost'), "Our prices are very competitive. Which product are you interested in?"),
+    (('shipping', 'delivery'), "We offer free shipping on orders over $50. Delivery usually takes 3-5 business days."),
+    (('return', 'exchange'), "We have a 30-day return policy. Items must be unused and in original packaging."),
+    (('electronics',), "We have a great selection of electronics including laptops, smartphones, and accessories. Check out our electronics category!"),
+    (('clothing', 'clothes'), "We offer a variety of men's and women's clothing. Is there a specific type you're looking for?"),
+    (('jewelry',), "Our jewelry collection includes rings, necklaces, earrings, and more. All made with high-quality materials."),
+]
+
+def get_local_response(message):
+    """Answers common shopping questions from keywords, without calling Gemini."""
+    lower_message = message.lower()
+    if 'hello' in lower_message or 'hi' in lower_message:
+        return LOCAL_GREETING_RESPONSE
+    for keywords, response in LOCAL_TOPIC_RESPONSES:
+        if any(keyword in lower_message for keyword in keywords):
+            return response
+    return LOCAL_DEFAULT_RESPONSE
+
+def get_fallback_response(message):
+    """
+    Keyword answer for /api/chat when Gemini misses its deadline.
+
+    Unlike get_local_response(), topics are checked before greetings and greetings
+    must be whole words, so "shipping" or "which" don't get the greeting reply.
+    """
+    lower_message = message.lower()
+    for keywords, response in LOCAL_TOPIC_RESPONSES:
+        if any(keyword in lower_message for keyword in keywords):
+            return response
+    if set(re.findall(r"[a-z]+", lower_message)) & {'hello', 'hi', 'hey'}:
+        return LOCAL_GREETING_RESPONSE
+    return LOCAL_DEFAULT_RESPONSE
+
+def classify_user_input_locally(user_input):
+    """Rule-based stand-in for the Gemini intent call, used when Gemini misses its deadline.
+
+    Only recognises intents that need the user's account; everything else is
+    'unknown' and is answered by get_fallback_response().
+    """
+    lower_input = user_input.lower()
+    words = set(re.findall(r"[a-z]+", lower_input))
+    if 'orders' in words or 'order history' in lower_input:
+        return {'intent': 'view_orders', 'entities': {}}
+    return {'intent': 'unknown', 'entities': {}}
     
 def fetch_product_details( product_query):
         """
@@ -183,7 +228,6 @@ def fetch_product_details( product_query):
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
             return None
-import re
 
 def parse_gemini_json_response(gemini_response):
     """
@@ -283,12 +327,59 @@ def analyze_user_input_with_gemini( user_input):
             print(f"Error parsing Gemini response or communicating with Gemini: {e}")
             return {'intent': 'unknown', 'entities': {}}
 
+def timed_analyze_user_input_with_gemini(user_input, submitted):
+    """Runs the Gemini intent call and returns (decision, latency_ms, queue_ms)."""
+    started = time.monotonic()
+    decision = analyze_user_input_with_gemini(user_input)
+    latency_ms = (time.monotonic() - started) * 1000
+    return decision, latency_ms, (started - submitted) * 1000
+
+def analyze_user_input_with_deadline(user_input, budget_ms):
+    """
+    Runs the Gemini intent call on the worker pool and waits at most budget_ms for it.
+
+    Returns the Gemini decision, or None if the deadline passed first. A call still
+    queued at the deadline is cancelled; one already running is left to finish and
+    its decision is written to intent_logs so late answers can be compared with the
+    local fallback. The write happens on intent_log_executor, never on the request
+    thread.
+    """
+    future = gemini_executor.submit(timed_analyze_user_input_with_gemini, user_input, time.monotonic())
+
+    def write_decision(decision, latency_ms, queue_ms, within_budget):
+        try:
+            intent_log_db.log_intent(user_input, decision.get('intent', 'unknown'), decision.get('entities', {}),
+                                     latency_ms, queue_ms, within_budget)
+        except Exception as e:
+            print(f"Failed to record Gemini intent decision: {e}")
+
+    def record_decision(done, within_budget):
+        if done.cancelled():
+            print("Gemini intent call cancelled before it started; skipped logging.")
+            return
+        intent_log_executor.submit(write_decision, *done.result(), within_budget)
+
+    try:
+        future.result(timeout=budget_ms / 1000)
+    except FutureTimeoutError:
+        print(f"Gemini intent call exceeded {budget_ms}ms budget; answering locally.")
+        future.cancel()
+        future.add_done_callback(lambda done: record_decision(done, False))
+        return None
+    future.add_done_callback(lambda done: record_decision(done, True))
+    return future.result()[0]
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
         data = request.get_json()
         message = data.get('message', '')
         response = None
+        source = 'gemini'
+        budget_ms = data.get('latency_budget_ms')
+        if isinstance(budget_ms, bool) or not isinstance(budget_ms, int) or budget_ms <= 0:
+            budget_ms = CHAT_LATENCY_BUDGET_MS
+        budget_ms = min(budget_ms, CHAT_LATENCY_BUDGET_MS)
         if GEMINI_ENABLED:
             try:
                 # Assuming 'gemini_session_id', 'user_db', 'analyze_user_input_with_gemini',
@@ -299,12 +390,17 @@ def chat():
                 # attributes of a class instance that this `chat` function belongs to.
                 # For pure formatting, I'll assume they are somehow accessible.
                 user = user_db.get_user_by_session_id(gemini_session_id)
-                agent_decision = analyze_user_input_with_gemini(message)
+                agent_decision = analyze_user_input_with_deadline(message, budget_ms)
+                if agent_decision is None:
+                    source = 'local'
+                    agent_decision = classify_user_input_locally(message)
 
                 intent = agent_decision.get('intent', 'unknown')
                 entities = agent_decision.get('entities', {})
 
                 response_text = "I'm sorry, I couldn't understand that. Can you please rephrase?"
+                if source == 'local' and intent == 'unknown':
+                    response_text = get_fallback_response(message)
 
                 # --- Agent Logic based on Intent ---
                 if intent == 'greet':
@@ -406,6 +502,7 @@ def chat():
                 response = "Sorry, I couldn't process your request with Gemini. Please try again later."
         else: # This 'else' belongs to 'if GEMINI_ENABLED'
              response = "Gemini is not enabled for this assistant." # Added a default if GEMINI_ENABLED is False
+             source = 'local'
         
         # This return would now return 'response_text' if Gemini was successful,
         # or an error message if Gemini failed or was disabled.
@@ -413,7 +510,7 @@ def chat():
         # that would need a re-evaluation of the 'response' variable's purpose.
         # For pure formatting, 'response' gets assigned.
         from flask import jsonify
-        return jsonify({'response': response})
+        return jsonify({'response': response, 'source': source})
     except Exception as e:
         print('Chat error:', e)
         # Assuming `jsonify` is imported from Flask or similar